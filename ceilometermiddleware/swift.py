@@ -37,11 +37,26 @@ before "proxy-server" and add the following filter in the file:
     topic = notifications
     # skip metering of requests from listed project ids
     ignore_projects = <proj_uuid>, <proj_uuid2>, <proj_name>
+    # skip metering of successful requests that neither received nor sent
+    # any bytes; failed requests are always metered
+    skip_empty_events = False
     # Whether to send events to messaging driver in a background thread
     nonblocking_notify = False
     # Queue size for sending notifications in background thread (0=unlimited).
     # New notifications will be discarded if the queue is full.
     send_queue_size = 1000
+    # Maximum number of queued events published together by the background
+    # thread. Batches of more than one event are sent as a single
+    # "objectstore.http.request.batch" notification.
+    send_batch_size = 1
+    # Maximum time in seconds the background thread waits for a batch to
+    # fill before sending it.
+    send_batch_wait = 0
+    # Number of times the background thread retries sending a batch before
+    # discarding it.
+    send_retries = 0
+    # Number of background threads sending notifications concurrently.
+    send_workers = 1
     # Logging level control
     log_level = WARNING
 
@@ -56,29 +71,57 @@ before "proxy-server" and add the following filter in the file:
     password = a_big_secret
     interface = public
 """
+import collections
 import datetime
 import functools
 import logging
+import os
 
 from keystoneauth1 import exceptions as ksa_exc
 from keystoneauth1.loading import adapter as ksa_adapter
 from keystoneauth1.loading import base as ksa_base
 from keystoneauth1.loading import session as ksa_session
-from keystoneclient.v3 import client as ks_client
 from oslo_config import cfg
 import oslo_messaging
 from oslo_utils import strutils
-from pycadf import event as cadf_event
+from pycadf import cadftype
 from pycadf.helper import api
-from pycadf import measurement as cadf_measurement
-from pycadf import metric as cadf_metric
-from pycadf import resource as cadf_resource
+from pycadf import identifier
 import queue
+import re
 import threading
+import time
 import urllib.parse as urlparse
 
 LOG = logging.getLogger(__name__)
 
+# Notifiers (and their transports) shared by all the middleware instances of
+# the process, keyed by their messaging configuration.
+_TRANSPORT_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+# Clock of the event timestamps, patched by the tests
+_time = time.time
+
+_METHOD_LOWER = {
+    m: m.lower()
+    for m in ('GET', 'HEAD', 'PUT', 'POST', 'DELETE', 'COPY', 'OPTIONS')}
+_CADF_ACTIONS = {m: api.convert_req_action(m) for m in _METHOD_LOWER}
+
+# Methods whose requests have no body unless they announce one
+_BODYLESS_METHODS = frozenset(('GET', 'HEAD', 'DELETE'))
+
+# CADF event fields that are the same for every notification. The nested
+# observer dict is shared by all the payloads and must not be modified.
+_EVENT_TEMPLATE = {
+    'typeURI': cadftype.CADF_VERSION_1_0_0 + 'event',
+    'eventType': cadftype.EVENTTYPE_ACTIVITY,
+    'observer': {'id': 'target'},
+}
+
+# Paths made only of characters that urllib.parse.quote() leaves untouched
+_is_quoted_path = re.compile(r'[A-Za-z0-9_.~/-]*').fullmatch
+
 
 def list_from_csv(comma_separated_str):
     if comma_separated_str:
@@ -89,15 +132,79 @@ def list_from_csv(comma_separated_str):
     return []
 
 
-def _log_and_ignore_error(fn):
-    @functools.wraps(fn)
-    def wrapper(*args, **kwargs):
-        try:
-            return fn(*args, **kwargs)
-        except Exception as e:
-            LOG.exception('An exception occurred processing '
-                          'the API call: %s ', e)
-    return wrapper
+# What emit_event() needs to know about a request to build its CADF event
+_EventRecord = collections.namedtuple('_EventRecord', [
+    'event_time', 'method', 'outcome', 'user_id', 'project_id',
+    'resource_id', 'metadata', 'bytes_received', 'bytes_sent'])
+
+
+def _utc_isoformat(timestamp):
+    return datetime.datetime.fromtimestamp(
+        timestamp, datetime.timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _bytes_measurement(result, name):
+    return {'result': result,
+            'metric': {'metricId': identifier.generate_uuid(),
+                       'unit': 'B',
+                       'name': name}}
+
+
+def _build_event(record):
+    """Build the CADF event of a request, as pycadf's Event.as_dict()."""
+    method = record.method
+    event = dict(
+        _EVENT_TEMPLATE,
+        id=identifier.generate_uuid(),
+        eventTime=_utc_isoformat(record.event_time),
+        action=_CADF_ACTIONS.get(method) or api.convert_req_action(method),
+        outcome=record.outcome,
+        initiator={
+            'id': record.user_id or identifier.generate_uuid(),
+            'typeURI': 'service/security/account/user',
+            'project_id': record.project_id,
+        },
+        target={
+            'id': record.resource_id,
+            'typeURI': 'service/storage/object',
+            'metadata': record.metadata,
+            'action': _METHOD_LOWER.get(method) or method.lower(),
+        })
+
+    measurements = []
+    if record.bytes_received:
+        measurements.append(_bytes_measurement(
+            record.bytes_received, 'storage.objects.incoming.bytes'))
+    if record.bytes_sent:
+        measurements.append(_bytes_measurement(
+            record.bytes_sent, 'storage.objects.outgoing.bytes'))
+    if measurements:
+        event['measurements'] = measurements
+    return event
+
+
+def _parse_path(path):
+    """Split <version>/<account>[/<container>[/<object>]] in one pass.
+
+    Returns a (version, account, container, object) tuple, with None for
+    the missing parts, or None if version or account is empty.
+    """
+    parts = path.split('/', 3)
+    if len(parts) < 2 or not parts[0] or not parts[1]:
+        return None
+    if len(parts) == 4:
+        return parts[0], parts[1], parts[2], parts[3]
+    if len(parts) == 3 and parts[2]:
+        return parts[0], parts[1], parts[2], None
+    return parts[0], parts[1], None, None
+
+
+def _has_request_body(env):
+    content_length = env.get('CONTENT_LENGTH')
+    if content_length:
+        return content_length != '0'
+    return (env.get('REQUEST_METHOD') not in _BODYLESS_METHODS
+            or 'HTTP_TRANSFER_ENCODING' in env)
 
 
 class InputProxy(object):
@@ -144,6 +251,9 @@ class KeystoneClientLoader(ksa_adapter.Adapter):
 
     @property
     def plugin_class(self):
+        # NOTE: keystoneclient is only needed to resolve ignore_projects
+        # names, so do not pay for importing it in every proxy worker.
+        from keystoneclient.v3 import client as ks_client
         return ks_client.Client
 
 
@@ -151,6 +261,7 @@ class Swift(object):
     """Swift middleware used for counting requests."""
 
     event_queue = None
+    event_senders = []
     threadLock = threading.Lock()
 
     DEFAULT_IGNORE_PROJECT_NAMES = ['service']
@@ -159,39 +270,26 @@ class Swift(object):
         self._app = app
 
         self.ignore_projects = self._get_ignore_projects(conf)
+        self._ignore_projects = frozenset(self.ignore_projects)
 
-        extra_config_files = conf.get('extra_config_files')
-        if extra_config_files is not None:
-            extra_config_files = list_from_csv(extra_config_files)
-
-        extra_config_dirs = conf.get('extra_config_dirs')
-        if extra_config_dirs is not None:
-            extra_config_dirs = list_from_csv(extra_config_dirs)
-
-        oslo_conf = cfg.ConfigOpts()
-        oslo_conf([], project='swift',
-                  default_config_files=extra_config_files,
-                  default_config_dirs=extra_config_dirs,
-                  validate_default_values=True)
-
-        oslo_messaging.set_transport_defaults(conf.get('control_exchange',
-                                                       'swift'))
-        self._notifier = oslo_messaging.Notifier(
-            oslo_messaging.get_notification_transport(oslo_conf,
-                                                      url=conf.get('url')),
-            publisher_id='ceilometermiddleware',
-            driver=conf.get('driver', 'messagingv2'),
-            topics=[conf.get('topic', 'notifications')])
+        self._notifier = self._get_notifier(conf)
 
         self.metadata_headers = [h.strip().replace('-', '_').lower()
                                  for h in conf.get(
                                      "metadata_headers",
                                      "").split(",") if h.strip()]
+        # (WSGI environ key, resource metadata key) of each metadata header
+        self._metadata_lookup = tuple(
+            ('HTTP_' + h.upper(), 'http_header_' + h)
+            for h in self.metadata_headers)
 
         self.reseller_prefix = conf.get('reseller_prefix', 'AUTH_')
         if self.reseller_prefix and self.reseller_prefix[-1] != '_':
             self.reseller_prefix += '_'
 
+        self.skip_empty_events = strutils.bool_from_string(
+            conf.get('skip_empty_events', False))
+
         LOG.setLevel(getattr(logging, conf.get('log_level', 'WARNING')))
 
         # NOTE: If the background thread's send queue fills up, the event will
@@ -202,15 +300,56 @@ class Swift(object):
         #  destination is unavailable.
         self.nonblocking_notify = strutils.bool_from_string(
             conf.get('nonblocking_notify', False))
+        self.send_batch_size = max(int(conf.get('send_batch_size', 1)), 1)
+        self.send_batch_wait = float(conf.get('send_batch_wait', 0))
+        self.send_retries = max(int(conf.get('send_retries', 0)), 0)
+        self.send_workers = max(int(conf.get('send_workers', 1)), 1)
 
-        # Initialize the sending queue and thread, but only once
-        if self.nonblocking_notify and Swift.event_queue is None:
-            Swift.threadLock.acquire()
-            if Swift.event_queue is None:
-                send_queue_size = int(conf.get('send_queue_size', 1000))
-                Swift.event_queue = queue.Queue(send_queue_size)
-                self.start_sender_thread()
-            Swift.threadLock.release()
+        # Pick how events are published once, instead of on every request
+        if self.nonblocking_notify:
+            self._publish = self._queue_event
+        else:
+            self._publish = functools.partial(self._send_event,
+                                              self._notifier)
+
+        if self.nonblocking_notify:
+            self.ensure_sender_started(int(conf.get('send_queue_size', 1000)))
+
+    @staticmethod
+    def _get_notifier(conf):
+        extra_config_files = conf.get('extra_config_files')
+        if extra_config_files is not None:
+            extra_config_files = list_from_csv(extra_config_files)
+
+        extra_config_dirs = conf.get('extra_config_dirs')
+        if extra_config_dirs is not None:
+            extra_config_dirs = list_from_csv(extra_config_dirs)
+
+        control_exchange = conf.get('control_exchange', 'swift')
+        driver = conf.get('driver', 'messagingv2')
+        topic = conf.get('topic', 'notifications')
+        key = (conf.get('url'), control_exchange, driver, topic,
+               tuple(extra_config_files or ()),
+               tuple(extra_config_dirs or ()))
+
+        with _CACHE_LOCK:
+            notifier = _TRANSPORT_CACHE.get(key)
+            if notifier is None:
+                oslo_conf = cfg.ConfigOpts()
+                oslo_conf([], project='swift',
+                          default_config_files=extra_config_files,
+                          default_config_dirs=extra_config_dirs,
+                          validate_default_values=True)
+
+                oslo_messaging.set_transport_defaults(control_exchange)
+                notifier = oslo_messaging.Notifier(
+                    oslo_messaging.get_notification_transport(
+                        oslo_conf, url=conf.get('url')),
+                    publisher_id='ceilometermiddleware',
+                    driver=driver,
+                    topics=[topic])
+                _TRANSPORT_CACHE[key] = notifier
+        return notifier
 
     def _get_ignore_projects(self, conf):
         if 'auth_type' not in conf:
@@ -250,7 +389,7 @@ class Swift(object):
     @staticmethod
     def _get_keystone_projects(client, name_or_id):
         try:
-            return [client.projects.get(name_or_id)]
+            return [client.projects.get(name_or_id).id]
         except ksa_exc.NotFound:
             pass
         if isinstance(name_or_id, bytes):
@@ -261,9 +400,21 @@ class Swift(object):
         return [p.id for p in projects]
 
     def __call__(self, env, start_response):
+        # Nothing to count for requests that will not be metered. Requests
+        # whose project is only known once the app has run are still
+        # filtered out by emit_event.
+        if self._is_ignored(env):
+            return self._app(env, start_response)
+
         start_response_args = [None]
-        input_proxy = InputProxy(env['wsgi.input'])
-        env['wsgi.input'] = input_proxy
+        if _has_request_body(env):
+            input_proxy = InputProxy(env['wsgi.input'])
+            env['wsgi.input'] = input_proxy
+        else:
+            input_proxy = None
+
+        def bytes_received():
+            return input_proxy.bytes_received if input_proxy else 0
 
         def my_start_response(status, headers, exc_info=None):
             start_response_args[0] = (status, list(headers), exc_info)
@@ -281,153 +432,267 @@ class Swift(object):
                 start_response(*start_response_args[0])
             bytes_sent = 0
             try:
-                while chunk:
-                    bytes_sent += len(chunk)
+                if chunk:
+                    bytes_sent = len(chunk)
                     yield chunk
-                    try:
-                        chunk = next(iterator)
-                    except StopIteration:
-                        chunk = ''
+                    for chunk in iterator:
+                        if chunk:
+                            bytes_sent += len(chunk)
+                            yield chunk
             finally:
                 close_method = getattr(iterable, 'close', None)
                 if callable(close_method):
                     close_method()
-                self.emit_event(env, input_proxy.bytes_received, bytes_sent)
+                self.emit_event(env, bytes_received(), bytes_sent)
 
         try:
             iterable = self._app(env, my_start_response)
         except Exception:
-            self.emit_event(env, input_proxy.bytes_received, 0, 'failure')
+            self.emit_event(env, bytes_received(), 0, 'failure')
             raise
         else:
             return iter_response(iterable)
 
-    @_log_and_ignore_error
+    def _is_ignored(self, env):
+        if env.get('swift.source') is not None:
+            return True
+        # Most deployments ignore nothing; skip the header lookups then.
+        return bool(self._ignore_projects) and (
+            env.get('HTTP_X_SERVICE_PROJECT_ID')
+            or env.get('HTTP_X_PROJECT_ID')
+            or env.get('HTTP_X_TENANT_ID')) in self._ignore_projects
+
     def emit_event(self, env, bytes_received, bytes_sent, outcome='success'):
-        if (
-                (env.get('HTTP_X_SERVICE_PROJECT_ID')
-                 or env.get('HTTP_X_PROJECT_ID')
-                 or env.get('HTTP_X_TENANT_ID')) in self.ignore_projects
-                or env.get('swift.source') is not None):
+        if self._is_ignored(env):
+            return
+        if (self.skip_empty_events and outcome == 'success'
+                and not (bytes_received or bytes_sent)):
             return
-
-        path = urlparse.quote(env.get('swift.backend_path', env['PATH_INFO']))
-        method = env['REQUEST_METHOD']
-        headers = {}
-        for header in env:
-            if header.startswith('HTTP_') and env[header]:
-                key = header[5:]
-                headers[key] = str(env[header])
 
         try:
-            container = obj = None
-            path = path.replace('/', '', 1)
-            version, account, remainder = path.split('/', 2)
-        except ValueError:
-            try:
-                version, account = path.split('/', 1)
-                remainder = None
-            except ValueError:
+            path = env.get('swift.backend_path', env['PATH_INFO'])
+            if not _is_quoted_path(path):
+                path = urlparse.quote(path)
+            method = env['REQUEST_METHOD']
+            if path.startswith('/'):
+                path = path[1:]
+            location = _parse_path(path)
+            if location is None:
                 return
+            version, account, container, obj = location
+
+            now = _time()
+
+            resource_metadata = {
+                "path": path,
+                "version": version,
+                "container": container,
+                "object": obj,
+            }
+
+            for env_key, metadata_key in self._metadata_lookup:
+                value = env.get(env_key)
+                if value:
+                    resource_metadata[metadata_key] = str(value)
+
+            # build object store details
+            if account.startswith(self.reseller_prefix):
+                resource_id = account[len(self.reseller_prefix):] or path
+            else:
+                resource_id = path
+            # The CADF event itself is built by _build_event(), in the sender
+            # thread when notifications are sent in the background.
+            self._publish(_EventRecord(
+                now, method, outcome, env.get('HTTP_X_USER_ID'),
+                env.get('HTTP_X_PROJECT_ID') or env.get('HTTP_X_TENANT_ID'),
+                resource_id, resource_metadata, bytes_received, bytes_sent))
+        except Exception as e:
+            LOG.exception('An exception occurred processing '
+                          'the API call: %s ', e)
+
+    @staticmethod
+    def _queue_event(record):
         try:
-            if not version or not account:
-                raise ValueError('Invalid path: %s' % path)
-            if remainder:
-                if '/' in remainder:
-                    container, obj = remainder.split('/', 1)
-                else:
-                    container = remainder
-        except ValueError:
-            return
+            Swift.event_queue.put_nowait(record)
+        except queue.Full:
+            LOG.warning('Send queue FULL: Event for %s not added',
+                        record.metadata['path'])
 
-        now = datetime.datetime.utcnow().isoformat()
-
-        resource_metadata = {
-            "path": path,
-            "version": version,
-            "container": container,
-            "object": obj,
-        }
-
-        for header in self.metadata_headers:
-            if header.upper() in headers:
-                resource_metadata['http_header_%s' % header] = headers.get(
-                    header.upper())
-
-        # build object store details
-        target = cadf_resource.Resource(
-            typeURI='service/storage/object',
-            id=account.partition(self.reseller_prefix)[2] or path)
-        target.metadata = resource_metadata
-        target.action = method.lower()
-
-        # build user details
-        initiator = cadf_resource.Resource(
-            typeURI='service/security/account/user',
-            id=env.get('HTTP_X_USER_ID'))
-        initiator.project_id = (env.get('HTTP_X_PROJECT_ID')
-                                or env.get('HTTP_X_TENANT_ID'))
-
-        # build notification body
-        event = cadf_event.Event(eventTime=now, outcome=outcome,
-                                 action=api.convert_req_action(method),
-                                 initiator=initiator, target=target,
-                                 observer=cadf_resource.Resource(id='target'))
-
-        # measurements
-        if bytes_received:
-            event.add_measurement(cadf_measurement.Measurement(
-                result=bytes_received,
-                metric=cadf_metric.Metric(
-                    name='storage.objects.incoming.bytes', unit='B')))
-        if bytes_sent:
-            event.add_measurement(cadf_measurement.Measurement(
-                result=bytes_sent,
-                metric=cadf_metric.Metric(
-                    name='storage.objects.outgoing.bytes', unit='B')))
+    @staticmethod
+    def _send_event(notifier, record):
+        Swift.send_notification(notifier, _build_event(record))
 
-        if self.nonblocking_notify:
-            try:
-                Swift.event_queue.put(event, False)
-                if not Swift.event_sender.is_alive():
-                    Swift.threadLock.acquire()
-                    self.start_sender_thread()
-                    Swift.threadLock.release()
-
-            except queue.Full:
-                LOG.warning('Send queue FULL: Event %s not added', event.id)
-        else:
-            Swift.send_notification(self._notifier, event)
+    def ensure_sender_started(self, send_queue_size):
+        """Initialize the shared sending queue and threads, but only once.
+
+        The first middleware instance to get here decides the queue size
+        and the sender settings; later instances reuse them. After a fork
+        the first instance built in the child starts the senders again,
+        with its own notifier.
+        """
+        if Swift.event_senders:
+            return
+        with Swift.threadLock:
+            if not Swift.event_senders:
+                if Swift.event_queue is None:
+                    # Without a linger time the sender takes whatever is
+                    # queued as soon as there is one event.
+                    flush_size = (self.send_batch_size
+                                  if self.send_batch_wait else 1)
+                    Swift.event_queue = EventBuffer(send_queue_size,
+                                                    flush_size)
+                self.start_sender_thread()
 
     def start_sender_thread(self):
-        Swift.event_sender = SendEventThread(self._notifier)
-        Swift.event_sender.daemon = True
-        Swift.event_sender.start()
+        Swift.event_senders = self._start_senders(
+            self.send_workers, self._notifier, Swift.event_queue,
+            self.send_batch_size, self.send_batch_wait, self.send_retries)
+
+    @staticmethod
+    def _start_senders(count, *args):
+        senders = [SendEventThread(*args) for i in range(count)]
+        for sender in senders:
+            sender.daemon = True
+            sender.start()
+        return senders
+
+    @staticmethod
+    def _reset_sender_after_fork():
+        """Drop the state a forked process must not share with its parent.
+
+        Threads do not survive fork(), the events queued before the fork
+        are sent by the parent process, and oslo.messaging transports are
+        not fork-safe. The child gets an empty send queue, no cached
+        notifiers and no senders; the next middleware instance built in
+        the child starts senders with a notifier of its own.
+        """
+        global _CACHE_LOCK
+        # Locks held by other threads at fork time would never be released
+        _CACHE_LOCK = threading.Lock()
+        _TRANSPORT_CACHE.clear()
+        Swift.threadLock = threading.Lock()
+        if Swift.event_queue is not None:
+            Swift.event_queue = EventBuffer(Swift.event_queue.maxsize,
+                                            Swift.event_queue.flush_size)
+        Swift.event_senders = []
 
     @staticmethod
     def send_notification(notifier, event):
-        notifier.info({}, 'objectstore.http.request', event.as_dict())
+        notifier.info({}, 'objectstore.http.request', event)
+
+    @staticmethod
+    def send_notification_batch(notifier, events):
+        if len(events) == 1:
+            Swift.send_notification(notifier, events[0])
+        else:
+            notifier.info({}, 'objectstore.http.request.batch',
+                          {'events': events})
+
+
+class EventBuffer(object):
+    """Double-buffered hand-off of events to the sender threads.
+
+    Request threads append to the pending deque while holding a short lock.
+    A sender thread takes at most one batch at a time, swapping in an empty
+    deque when the whole pending one fits, and sends it without holding
+    the lock. Any backlog beyond one batch is left for the other senders,
+    and taking a batch from it costs the batch size, not the backlog size.
+    """
+
+    def __init__(self, maxsize=0, flush_size=1):
+        self.maxsize = maxsize
+        self.flush_size = flush_size
+        self._events = collections.deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def __len__(self):
+        return len(self._events)
+
+    def put_nowait(self, event):
+        with self._lock:
+            if 0 < self.maxsize <= len(self._events):
+                raise queue.Full
+            self._events.append(event)
+            if len(self._events) == self.flush_size:
+                self._ready.set()
+
+    def swap(self, timeout=None, limit=None):
+        """Take up to limit pending events, or all of them by default.
+
+        Wait until flush_size events are pending or timeout expires. When
+        events are left behind the buffer stays ready, so that other
+        sender threads pick up the backlog in parallel.
+        """
+        self._ready.wait(timeout)
+        with self._lock:
+            if limit and len(self._events) > limit:
+                popleft = self._events.popleft
+                return [popleft() for i in range(limit)]
+            events, self._events = self._events, collections.deque()
+            self._ready.clear()
+        return list(events)
 
 
 class SendEventThread(threading.Thread):
 
-    def __init__(self, notifier):
+    # Delay in seconds before the next publish after a failure, doubled on
+    # each consecutive failure up to MAX_BACKOFF.
+    INITIAL_BACKOFF = 0.1
+    MAX_BACKOFF = 5.0
+
+    def __init__(self, notifier, event_queue, batch_size=1, batch_wait=0,
+                 retries=0):
         super(SendEventThread, self).__init__()
         self.notifier = notifier
+        self.event_queue = event_queue
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.retries = retries
+        self._backoff = 0
+
+    def _get_batch(self):
+        """Wait for events and take at most batch_size of them."""
+        return self.event_queue.swap(self.batch_wait or None,
+                                     self.batch_size)
+
+    def _send(self, events):
+        """Send events, retrying up to self.retries times on failure."""
+        attempts = self.retries + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                Swift.send_notification_batch(self.notifier, events)
+                self._backoff = 0
+                LOG.debug('%d event(s) sent.', len(events))
+                return
+            except Exception:
+                LOG.exception('Failed to send %d event(s) (attempt %d of %d)',
+                              len(events), attempt, attempts)
+                # Do not spin on the queue while the broker keeps failing
+                self._backoff = min(max(self._backoff * 2,
+                                        self.INITIAL_BACKOFF),
+                                    self.MAX_BACKOFF)
+                time.sleep(self._backoff)
+        LOG.error('Discarding %d event(s) after %d failed attempts',
+                  len(events), attempts)
 
     def run(self):
         """Send events without blocking swift proxy."""
         while True:
             try:
                 LOG.debug('Wait for event from send queue')
-                event = Swift.event_queue.get()
-                LOG.debug('Got event %s from queue - now send it', event.id)
-                Swift.send_notification(self.notifier, event)
-                LOG.debug('Event %s sent.', event.id)
+                records = self._get_batch()
+                if records:
+                    LOG.debug('Got %d event(s) from queue - now send them',
+                              len(records))
+                    self._send([_build_event(r) for r in records])
             except BaseException:
                 LOG.exception("SendEventThread loop exception")
 
 
+os.register_at_fork(after_in_child=Swift._reset_sender_after_fork)
+
+
 def filter_factory(global_conf, **local_conf):
     conf = global_conf.copy()
     conf.update(local_conf)
@@ -12,30 +12,78 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
-from io import StringIO
+import collections
+import io
+import queue
 import threading
+import types
 import unittest
 from unittest import mock
 
 from oslo_config import cfg
+from pycadf import event as cadf_event
+from pycadf.helper import api
+from pycadf import measurement as cadf_measurement
+from pycadf import metric as cadf_metric
+from pycadf import resource as cadf_resource
 
 from ceilometermiddleware import swift
 from ceilometermiddleware.tests import base as tests_base
+from keystoneauth1 import exceptions as ksa_exc
 from keystoneauth1.fixture import keystoneauth_betamax as betamax
+from keystoneclient.v3 import projects
+
+# Shared by every request without a body; reading it at EOF never moves it,
+# so tests must not write to it.
+_EMPTY_INPUT = io.BytesIO(b'')
+
+_HTTP_HEADER_PREFIX = 'http_header_'
+
+# Read-only environ templates; FakeRequest copies them
+_GET_ENV = types.MappingProxyType({'REQUEST_METHOD': 'GET'})
+_HEAD_ENV = types.MappingProxyType({'REQUEST_METHOD': 'HEAD'})
+
+# Environ keys the middleware reads the request project from
+_PROJECT_HEADERS = ('HTTP_X_SERVICE_PROJECT_ID', 'HTTP_X_PROJECT_ID',
+                    'HTTP_X_TENANT_ID')
+
+# How long to wait for the background sender before failing a test
+_NOTIFY_TIMEOUT = 10
+
+# Every test class sees the same transport
+_FAKE_TRANSPORT = mock.MagicMock()
+
+
+def _consume(iterable):
+    """Run a WSGI response to completion, discarding the chunks."""
+    collections.deque(iterable, maxlen=0)
 
 
 class FakeApp(object):
+    __slots__ = ('body', '_content_length')
+
     def __init__(self, body=None):
-        self.body = body or ['This string is 28 bytes long']
+        self.body = body or [b'This string is 28 bytes long']
+        self._content_length = str(sum(map(len, self.body)))
 
     def __call__(self, env, start_response):
-        yield
+        if self.body == [b'']:
+            # Nothing to stream: answer straight away like most apps do.
+            self._start(env, start_response)
+            return self.body
+        return self._stream(env, start_response)
+
+    def _start(self, env, start_response):
         start_response('200 OK', [
             ('Content-Type', 'text/plain'),
-            ('Content-Length', str(sum(map(len, self.body))))
+            ('Content-Length', self._content_length)
         ])
-        while env['wsgi.input'].read(5):
-            pass
+        env['wsgi.input'].read()
+
+    def _stream(self, env, start_response):
+        # Only call start_response once iterated, as lazy apps may do.
+        yield
+        self._start(env, start_response)
         for line in self.body:
             yield line
 
@@ -47,27 +95,55 @@ class FakeRequest(object):
     wsgi.input and headers.
     """
 
+    __slots__ = ('environ',)
+
     def __init__(self, path, environ=None, headers=None):
-        environ = environ or {}
+        # Work on a copy so that shared templates stay untouched
+        environ = dict(environ or ())
         headers = headers or {}
 
         environ['PATH_INFO'] = path
 
-        if 'wsgi.input' not in environ:
-            environ['wsgi.input'] = StringIO('')
+        environ.setdefault('wsgi.input', _EMPTY_INPUT)
 
-        for header, value in headers.items():
-            environ['HTTP_%s' % header.upper()] = value
+        environ.update(('HTTP_' + header.upper(), value)
+                       for header, value in headers.items())
         self.environ = environ
 
 
-@mock.patch('oslo_messaging.get_transport', mock.MagicMock())
+# FakeApp keeps no state between calls, so tests can share these.
+_FAKE_APP = FakeApp()
+_EMPTY_APP = FakeApp(body=[b''])
+
+
 class TestSwift(tests_base.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        super(TestSwift, cls).setUpClass()
+        # The middleware reads its own ConfigOpts; the global one is only
+        # parsed once so that nothing trips over an uninitialized CONF.
+        cfg.CONF([], project='ceilometermiddleware')
+        cls.addClassCleanup(cfg.CONF.reset)
+        patcher = mock.patch('oslo_messaging.get_transport',
+                             _FAKE_TRANSPORT)
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
+        # The middleware keeps no per-request state on the instance, so
+        # tests using the default configuration can share one.
+        cls.app = swift.Swift(_FAKE_APP, {})
+        cls.empty_app = swift.Swift(_EMPTY_APP, {})
+
     def setUp(self):
         super(TestSwift, self).setUp()
-        cfg.CONF([], project='ceilometermiddleware')
-        self.addCleanup(cfg.CONF.reset)
+        patcher = mock.patch('oslo_messaging.Notifier.info')
+        self.notify = patcher.start()
+        self.addCleanup(patcher.stop)
+        _FAKE_TRANSPORT.reset_mock()
+        # Each test using nonblocking_notify gets its own queue and thread
+        self.addCleanup(setattr, swift.Swift, 'event_queue', None)
+        self.addCleanup(setattr, swift.Swift, 'event_senders', [])
+        self.addCleanup(swift._TRANSPORT_CACHE.clear)
 
     @staticmethod
     def start_response(*args):
@@ -76,374 +152,568 @@ class TestSwift(tests_base.TestCase):
     def get_request(self, path, environ=None, headers=None):
         return FakeRequest(path, environ=environ, headers=headers)
 
+    def _assert_location(self, metadata, container='container', obj='obj'):
+        expected = {'version': '1.0', 'container': container, 'object': obj}
+        self.assertEqual(expected, {k: metadata.get(k) for k in expected})
+
+    def _assert_notify(self, action, result=None, metric=None,
+                       container='container', obj='obj'):
+        """Check the single notification sent and return its metadata."""
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        self.assertEqual('objectstore.http.request', data[1])
+        if metric is None:
+            self.assertIsNone(data[2].get('measurements'))
+        else:
+            measurement = data[2]['measurements'][0]
+            self.assertEqual(result, measurement['result'])
+            self.assertEqual(metric, measurement['metric']['name'])
+        target = data[2]['target']
+        self._assert_location(target['metadata'], container, obj)
+        self.assertEqual(action, target['action'])
+        return target['metadata']
+
+    def _run_case(self, method, path='/1.0/account/container/obj',
+                  wsgi_input=None, app=None, result=None, metric=None,
+                  container='container', obj='obj'):
+        """Send one request and check the notification emitted for it."""
+        self.notify.reset_mock()
+        environ = {'REQUEST_METHOD': method}
+        if wsgi_input is not None:
+            environ['wsgi.input'] = io.BytesIO(wsgi_input)
+        app = app or self.app
+        req = self.get_request(path, environ=environ)
+        resp = list(app(req.environ, self.start_response))
+        self._assert_notify(method.lower(), result, metric, container, obj)
+        return resp
+
+    def _background_app(self, fail_first=False, **conf):
+        """Build a non-blocking app whose notifications can be awaited."""
+        self._notified = queue.SimpleQueue()
+
+        def info(*args, **kwargs):
+            if fail_first and self.notify.call_count == 1:
+                raise Exception('broker unavailable')
+            self._notified.put(None)
+
+        self.notify.side_effect = info
+        conf['nonblocking_notify'] = 'True'
+        return swift.Swift(_FAKE_APP, conf)
+
+    def _wait_notified(self, n=1):
+        """Wait until the sender threads have sent n notifications."""
+        for i in range(n):
+            self._notified.get(timeout=_NOTIFY_TIMEOUT)
+
     def test_get(self):
-        app = swift.Swift(FakeApp(), {})
+        resp = self._run_case('GET', result=28,
+                              metric='storage.objects.outgoing.bytes')
+        self.assertEqual([b"This string is 28 bytes long"], resp)
+
+    def test_event_matches_pycadf(self):
+        app = self.app
+        req = self.get_request('/1.0/AUTH_account/container/obj',
+                               environ={'REQUEST_METHOD': 'GET',
+                                        'HTTP_X_USER_ID': 'user',
+                                        'HTTP_X_PROJECT_ID': 'project'})
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(self.notify.call_args_list))
+        payload = self.notify.call_args_list[0][0][2]
+
+        target = cadf_resource.Resource(typeURI='service/storage/object',
+                                        id='account')
+        target.metadata = payload['target']['metadata']
+        target.action = 'get'
+        initiator = cadf_resource.Resource(
+            typeURI='service/security/account/user', id='user')
+        initiator.project_id = 'project'
+        expected = cadf_event.Event(
+            id=payload['id'], eventTime=payload['eventTime'],
+            outcome='success', action=api.convert_req_action('GET'),
+            initiator=initiator, target=target,
+            observer=cadf_resource.Resource(id='target'))
+        expected.add_measurement(cadf_measurement.Measurement(
+            result=28,
+            metric=cadf_metric.Metric(
+                metricId=payload['measurements'][0]['metric']['metricId'],
+                name='storage.objects.outgoing.bytes', unit='B')))
+        self.assertEqual(expected.as_dict(), payload)
+
+    def test_event_time(self):
+        app = self.app
+        req = self.get_request('/1.0/account/container/obj',
+                               environ=_GET_ENV)
+        with mock.patch.object(swift, '_time', return_value=1700000000.25):
+            _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        self.assertEqual('2023-11-14T22:13:20.250000',
+                         data[2]['eventTime'])
+
+    def test_get_empty_chunk(self):
+        app = swift.Swift(FakeApp(body=[b'first', b'', b'second']), {})
         req = self.get_request('/1.0/account/container/obj',
-                               environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            resp = app(req.environ, self.start_response)
-            self.assertEqual(["This string is 28 bytes long"], list(resp))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            self.assertEqual(28, data[2]['measurements'][0]['result'])
-            self.assertEqual('storage.objects.outgoing.bytes',
-                             data[2]['measurements'][0]['metric']['name'])
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertEqual('container', metadata['container'])
-            self.assertEqual('obj', metadata['object'])
-            self.assertEqual('get', data[2]['target']['action'])
+                               environ=_GET_ENV)
+        resp = app(req.environ, self.start_response)
+        self.assertEqual([b'first', b'second'], list(resp))
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        self.assertEqual(11, data[2]['measurements'][0]['result'])
 
     def test_get_background(self):
-        notified = threading.Event()
-        app = swift.Swift(FakeApp(),
+        app = self._background_app(send_queue_size='1')
+        req = self.get_request('/1.0/account/container/obj',
+                               environ=_GET_ENV)
+        resp = app(req.environ, self.start_response)
+        self.assertEqual([b"This string is 28 bytes long"], list(resp))
+        self._wait_notified()
+        self._assert_notify('get', 28, 'storage.objects.outgoing.bytes')
+
+    def test_get_background_unbounded_queue(self):
+        app = self._background_app(send_queue_size='0')
+        self.assertEqual(0, swift.Swift.event_queue.maxsize)
+        req = self.get_request('/1.0/account/container/obj',
+                               environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self._wait_notified()
+        self.assertEqual(1, len(self.notify.call_args_list))
+
+    def test_get_background_after_fork(self):
+        parent_app = self._background_app(send_queue_size='5')
+        event_queue = swift.Swift.event_queue
+        swift.Swift._reset_sender_after_fork()
+        self.assertIsNot(event_queue, swift.Swift.event_queue)
+        self.assertEqual(5, swift.Swift.event_queue.maxsize)
+        self.assertEqual([], swift.Swift.event_senders)
+        self.assertEqual({}, swift._TRANSPORT_CACHE)
+        # The worker loads its own pipeline, which must not reuse the
+        # parent's notifier and transport.
+        app = self._background_app(send_queue_size='5')
+        self.assertIsNot(parent_app._notifier, app._notifier)
+        self.assertEqual(1, len(swift.Swift.event_senders))
+        self.assertIs(app._notifier, swift.Swift.event_senders[0].notifier)
+        self.assertTrue(swift.Swift.event_senders[0].is_alive())
+        req = self.get_request('/1.0/account/container/obj',
+                               environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self._wait_notified()
+        self.assertEqual(1, len(self.notify.call_args_list))
+        self.assertEqual(0, len(event_queue))
+
+    def test_get_background_workers(self):
+        app = self._background_app(send_workers='3')
+        self.assertEqual(3, len(swift.Swift.event_senders))
+        self.assertTrue(all(s.is_alive() for s in swift.Swift.event_senders))
+        for obj in ('obj1', 'obj2', 'obj3'):
+            req = self.get_request('/1.0/account/container/%s' % obj,
+                                   environ=_GET_ENV)
+            _consume(app(req.environ, self.start_response))
+        self._wait_notified(3)
+        self.assertEqual(
+            ['obj1', 'obj2', 'obj3'],
+            sorted(c[0][2]['target']['metadata']['object']
+                   for c in self.notify.call_args_list))
+
+    def test_get_background_batch(self):
+        app = self._background_app(send_batch_size='2',
+                                   send_batch_wait='10')
+        for obj in ('obj1', 'obj2'):
+            req = self.get_request('/1.0/account/container/%s' % obj,
+                                   environ=_GET_ENV)
+            _consume(app(req.environ, self.start_response))
+        self._wait_notified()
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        self.assertEqual('objectstore.http.request.batch', data[1])
+        events = data[2]['events']
+        self.assertEqual(2, len(events))
+        self.assertEqual(['obj1', 'obj2'],
+                         [e['target']['metadata']['object']
+                          for e in events])
+        self.assertEqual(28, events[0]['measurements'][0]['result'])
+
+    def test_get_background_send_failure(self):
+        app = self._background_app(fail_first=True)
+        for obj in ('obj1', 'obj2'):
+            req = self.get_request('/1.0/account/container/%s' % obj,
+                                   environ=_GET_ENV)
+            _consume(app(req.environ, self.start_response))
+        self._wait_notified()
+        self.assertEqual(2, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[1][0]
+        self.assertEqual('obj2', data[2]['target']['metadata']['object'])
+
+    def test_get_background_send_retry(self):
+        app = self._background_app(fail_first=True, send_retries='1')
+        req = self.get_request('/1.0/account/container/obj',
+                               environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self._wait_notified()
+        self.assertEqual(2, len(self.notify.call_args_list))
+        self.assertEqual(self.notify.call_args_list[0],
+                         self.notify.call_args_list[1])
+
+    def test_get_background_queue_full(self):
+        app = swift.Swift(_FAKE_APP,
                           {"nonblocking_notify": "True",
                            "send_queue_size": "1"})
         req = self.get_request('/1.0/account/container/obj',
-                               environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info',
-                        side_effect=lambda *args, **kwargs: notified.set()
-                        ) as notify:
-            resp = app(req.environ, self.start_response)
-            self.assertEqual(["This string is 28 bytes long"], list(resp))
-            notified.wait()
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            self.assertEqual(28, data[2]['measurements'][0]['result'])
-            self.assertEqual('storage.objects.outgoing.bytes',
-                             data[2]['measurements'][0]['metric']['name'])
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertEqual('container', metadata['container'])
-            self.assertEqual('obj', metadata['object'])
-            self.assertEqual('get', data[2]['target']['action'])
-
-    def test_put(self):
-        app = swift.Swift(FakeApp(body=['']), {})
-        req = self.get_request(
-            '/1.0/account/container/obj',
-            environ={'REQUEST_METHOD': 'PUT',
-                     'wsgi.input':
-                     StringIO('some stuff')})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            self.assertEqual(10, data[2]['measurements'][0]['result'])
-            self.assertEqual('storage.objects.incoming.bytes',
-                             data[2]['measurements'][0]['metric']['name'])
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertEqual('container', metadata['container'])
-            self.assertEqual('obj', metadata['object'])
-            self.assertEqual('put', data[2]['target']['action'])
-
-    def test_post(self):
-        app = swift.Swift(FakeApp(body=['']), {})
+                               environ=_GET_ENV)
+        # Swap in a buffer that the sender thread does not drain
+        swift.Swift.event_queue = swift.EventBuffer(1)
+        with mock.patch.object(swift.LOG, 'warning') as warning:
+            _consume(app(req.environ, self.start_response))
+            _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(swift.Swift.event_queue))
+        self.assertEqual(1, warning.call_count)
+
+    def test_methods(self):
+        incoming = 'storage.objects.incoming.bytes'
+        outgoing = 'storage.objects.outgoing.bytes'
+        cases = [
+            dict(method='PUT', wsgi_input=b'some stuff', result=10,
+                 metric=incoming),
+            dict(method='POST', wsgi_input=b'some other stuff', result=16,
+                 metric=incoming),
+            dict(method='HEAD'),
+            # Even an arbitrary request method is metered
+            dict(method='BOGUS'),
+            dict(method='GET', path='/1.0/account/container',
+                 app=self.app, result=28, metric=outgoing, obj=None),
+            dict(method='HEAD', path='/1.0/account', container=None,
+                 obj=None),
+        ]
+        for case in cases:
+            case.setdefault('app', self.empty_app)
+            with self.subTest(method=case['method'], path=case.get('path')):
+                self._run_case(**case)
+
+    def test_input_not_wrapped_without_body(self):
+        app = self.app
+        req = self.get_request('/1.0/account/container/obj',
+                               environ=_GET_ENV)
+        wsgi_input = req.environ['wsgi.input']
+        _consume(app(req.environ, self.start_response))
+        self.assertIs(wsgi_input, req.environ['wsgi.input'])
+        self.assertEqual(1, len(self.notify.call_args_list))
+
+    def test_get_with_body(self):
+        app = self.empty_app
         req = self.get_request(
             '/1.0/account/container/obj',
-            environ={'REQUEST_METHOD': 'POST',
-                     'wsgi.input': StringIO('some other stuff')})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            self.assertEqual(16, data[2]['measurements'][0]['result'])
-            self.assertEqual('storage.objects.incoming.bytes',
-                             data[2]['measurements'][0]['metric']['name'])
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertEqual('container', metadata['container'])
-            self.assertEqual('obj', metadata['object'])
-            self.assertEqual('post', data[2]['target']['action'])
-
-    def test_head(self):
-        app = swift.Swift(FakeApp(body=['']), {})
+            environ={'REQUEST_METHOD': 'GET',
+                     'CONTENT_LENGTH': '10',
+                     'wsgi.input': io.BytesIO(b'some stuff')})
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        measurement = data[2]['measurements'][0]
+        self.assertEqual(10, measurement['result'])
+        self.assertEqual('storage.objects.incoming.bytes',
+                         measurement['metric']['name'])
+
+    def test_skip_empty_events(self):
+        app = swift.Swift(_EMPTY_APP, {'skip_empty_events': 'True'})
         req = self.get_request('/1.0/account/container/obj',
-                               environ={'REQUEST_METHOD': 'HEAD'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            self.assertIsNone(data[2].get('measurements'))
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertEqual('container', metadata['container'])
-            self.assertEqual('obj', metadata['object'])
-            self.assertEqual('head', data[2]['target']['action'])
-
-    def test_bogus_request(self):
-        """Test even for arbitrary request method, this will still work."""
-        app = swift.Swift(FakeApp(body=['']), {})
+                               environ=_HEAD_ENV)
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(0, len(self.notify.call_args_list))
         req = self.get_request('/1.0/account/container/obj',
-                               environ={'REQUEST_METHOD': 'BOGUS'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            self.assertIsNone(data[2].get('measurements'))
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertEqual('container', metadata['container'])
-            self.assertEqual('obj', metadata['object'])
-            self.assertEqual('bogus', data[2]['target']['action'])
-
-    def test_get_container(self):
-        app = swift.Swift(FakeApp(), {})
-        req = self.get_request('/1.0/account/container',
-                               environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            self.assertEqual(28, data[2]['measurements'][0]['result'])
-            self.assertEqual('storage.objects.outgoing.bytes',
-                             data[2]['measurements'][0]['metric']['name'])
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertEqual('container', metadata['container'])
-            self.assertIsNone(metadata['object'])
-            self.assertEqual('get', data[2]['target']['action'])
+                               environ={'REQUEST_METHOD': 'PUT',
+                                        'wsgi.input':
+                                        io.BytesIO(b'some stuff')})
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(self.notify.call_args_list))
+
+    def test_get_nested_object(self):
+        app = self.app
+        req = self.get_request('/1.0/account/container/dir/obj',
+                               environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        metadata = data[2]['target']['metadata']
+        self.assertEqual('1.0/account/container/dir/obj',
+                         metadata['path'])
+        self._assert_location(metadata, obj='dir/obj')
+
+    def test_get_quoted_path(self):
+        app = self.app
+        req = self.get_request('/1.0/account/container 1/obj\u00e9',
+                               environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        metadata = data[2]['target']['metadata']
+        self.assertEqual('1.0/account/container%201/obj%C3%A9',
+                         metadata['path'])
+        self.assertEqual('container%201', metadata['container'])
+        self.assertEqual('obj%C3%A9', metadata['object'])
 
     def test_no_metadata_headers(self):
-        app = swift.Swift(FakeApp(), {})
+        app = self.app
         req = self.get_request('/1.0/account/container',
-                               environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertEqual('container', metadata['container'])
-            self.assertIsNone(metadata['object'])
-            self.assertEqual('get', data[2]['target']['action'])
-            http_headers = [k for k in metadata.keys()
-                            if k.startswith('http_header_')]
-            self.assertEqual(0, len(http_headers))
+                               environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        metadata = self._assert_notify(
+            'get', 28, 'storage.objects.outgoing.bytes', obj=None)
+        self.assertEqual(0, sum(1 for k in metadata
+                                if k.startswith(_HTTP_HEADER_PREFIX)))
 
     def test_metadata_headers(self):
-        app = swift.Swift(FakeApp(), {
+        app = swift.Swift(_FAKE_APP, {
             'metadata_headers': 'X_VAR1, x-var2, x-var3, token'
         })
         req = self.get_request('/1.0/account/container',
-                               environ={'REQUEST_METHOD': 'GET'},
+                               environ=_GET_ENV,
                                headers={'X_VAR1': 'value1',
                                         'X_VAR2': 'value2',
                                         'TOKEN': 'token'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertEqual('container', metadata['container'])
-            self.assertIsNone(metadata['object'])
-            self.assertEqual('get', data[2]['target']['action'])
-            http_headers = [k for k in metadata.keys()
-                            if k.startswith('http_header_')]
-            self.assertEqual(3, len(http_headers))
-            self.assertEqual('value1', metadata['http_header_x_var1'])
-            self.assertEqual('value2', metadata['http_header_x_var2'])
-            self.assertEqual('token', metadata['http_header_token'])
-            self.assertNotIn('http_header_x_var3', metadata)
+        _consume(app(req.environ, self.start_response))
+        metadata = self._assert_notify(
+            'get', 28, 'storage.objects.outgoing.bytes', obj=None)
+        self.assertEqual(3, sum(1 for k in metadata
+                                if k.startswith(_HTTP_HEADER_PREFIX)))
+        self.assertEqual('value1', metadata['http_header_x_var1'])
+        self.assertEqual('value2', metadata['http_header_x_var2'])
+        self.assertEqual('token', metadata['http_header_token'])
+        self.assertNotIn('http_header_x_var3', metadata)
 
     def test_metadata_headers_unicode(self):
-        app = swift.Swift(FakeApp(), {
+        app = swift.Swift(_FAKE_APP, {
             'metadata_headers': 'unicode'
         })
         uni = u'\xef\xbd\xa1\xef\xbd\xa5'
         req = self.get_request('/1.0/account/container',
-                               environ={'REQUEST_METHOD': 'GET'},
+                               environ=_GET_ENV,
                                headers={'UNICODE': uni})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertEqual('container', metadata['container'])
-            self.assertIsNone(metadata['object'])
-            self.assertEqual('get', data[2]['target']['action'])
-            http_headers = [k for k in metadata.keys()
-                            if k.startswith('http_header_')]
-            self.assertEqual(1, len(http_headers))
-            self.assertEqual(str(uni),
-                             metadata['http_header_unicode'])
+        _consume(app(req.environ, self.start_response))
+        metadata = self._assert_notify(
+            'get', 28, 'storage.objects.outgoing.bytes', obj=None)
+        self.assertEqual(1, sum(1 for k in metadata
+                                if k.startswith(_HTTP_HEADER_PREFIX)))
+        self.assertEqual(uni, metadata['http_header_unicode'])
+
+    def test_metadata_headers_many(self):
+        names = ['x-var%d' % i for i in range(50)]
+        app = swift.Swift(_FAKE_APP, {'metadata_headers': ','.join(names)})
+        req = self.get_request('/1.0/account/container',
+                               environ=_GET_ENV,
+                               headers={'X_VAR%d' % i: 'value%d' % i
+                                        for i in range(0, 50, 2)})
+        _consume(app(req.environ, self.start_response))
+        metadata = self._assert_notify(
+            'get', 28, 'storage.objects.outgoing.bytes', obj=None)
+        self.assertEqual(
+            {'http_header_x_var%d' % i: 'value%d' % i
+             for i in range(0, 50, 2)},
+            {k: v for k, v in metadata.items()
+             if k.startswith(_HTTP_HEADER_PREFIX)})
 
     def test_metadata_headers_on_not_existing_header(self):
-        app = swift.Swift(FakeApp(), {
+        app = swift.Swift(_FAKE_APP, {
             'metadata_headers': 'x-var3'
         })
         req = self.get_request('/1.0/account/container',
-                               environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertEqual('container', metadata['container'])
-            self.assertIsNone(metadata['object'])
-            self.assertEqual('get', data[2]['target']['action'])
-            http_headers = [k for k in metadata.keys()
-                            if k.startswith('http_header_')]
-            self.assertEqual(0, len(http_headers))
+                               environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        metadata = self._assert_notify(
+            'get', 28, 'storage.objects.outgoing.bytes', obj=None)
+        self.assertEqual(0, sum(1 for k in metadata
+                                if k.startswith(_HTTP_HEADER_PREFIX)))
 
     def test_bogus_path(self):
-        app = swift.Swift(FakeApp(), {})
+        app = self.app
         req = FakeRequest('/5.0//',
-                          environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(0, len(notify.call_args_list))
+                          environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(0, len(self.notify.call_args_list))
 
     def test_missing_resource_id(self):
-        app = swift.Swift(FakeApp(), {})
-        req = FakeRequest('/v1/', environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(0, len(notify.call_args_list))
+        app = self.app
+        req = FakeRequest('/v1/', environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(0, len(self.notify.call_args_list))
 
     @mock.patch('urllib.parse.quote')
     def test_emit_event_fail(self, mocked_func):
         mocked_func.side_effect = Exception("a exception")
-        app = swift.Swift(FakeApp(body=["test"]), {})
+        app = swift.Swift(FakeApp(body=[b"test"]), {})
+        req = self.get_request('/1.0/account/container 1',
+                               environ=_GET_ENV)
+        resp = list(app(req.environ, self.start_response))
+        self.assertEqual(0, len(self.notify.call_args_list))
+        self.assertEqual([b"test"], resp)
+
+    def test_app_failure(self):
+        app = swift.Swift(mock.Mock(side_effect=ValueError('boom')), {})
         req = self.get_request('/1.0/account/container',
-                               environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            resp = list(app(req.environ, self.start_response))
-            self.assertEqual(0, len(notify.call_args_list))
-            self.assertEqual(["test"], resp)
+                               environ=_GET_ENV)
+        self.assertRaises(ValueError, app, req.environ,
+                          self.start_response)
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        self.assertEqual('failure', data[2]['outcome'])
+
+    def test_app_failure_skip_empty_events(self):
+        app = swift.Swift(mock.Mock(side_effect=ValueError('boom')),
+                          {'skip_empty_events': 'True'})
+        req = self.get_request('/1.0/account/container',
+                               environ=_GET_ENV)
+        self.assertRaises(ValueError, app, req.environ,
+                          self.start_response)
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        self.assertEqual('failure', data[2]['outcome'])
+
+    @mock.patch('urllib.parse.quote')
+    def test_app_failure_emit_event_fail(self, mocked_func):
+        mocked_func.side_effect = Exception("a exception")
+        app = swift.Swift(mock.Mock(side_effect=ValueError('boom')), {})
+        req = self.get_request('/1.0/account/container 1',
+                               environ=_GET_ENV)
+        self.assertRaises(ValueError, app, req.environ,
+                          self.start_response)
+        self.assertEqual(0, len(self.notify.call_args_list))
 
     def test_reseller_prefix(self):
-        app = swift.Swift(FakeApp(), {})
+        app = self.app
         req = self.get_request('/1.0/AUTH_account/container/obj',
-                               environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual("account", data[2]['target']['id'])
+                               environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        self.assertEqual("account", data[2]['target']['id'])
 
     def test_custom_prefix(self):
-        app = swift.Swift(FakeApp(), {'reseller_prefix': 'CUSTOM_'})
+        app = swift.Swift(_FAKE_APP, {'reseller_prefix': 'CUSTOM_'})
         req = FakeRequest('/1.0/CUSTOM_account/container/obj',
-                          environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual("account", data[2]['target']['id'])
+                          environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        self.assertEqual("account", data[2]['target']['id'])
+
+    def test_no_reseller_prefix(self):
+        app = swift.Swift(_FAKE_APP, {'reseller_prefix': ''})
+        req = FakeRequest('/1.0/account/container/obj',
+                          environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        self.assertEqual("account", data[2]['target']['id'])
 
     def test_incomplete_reseller_prefix(self):
         # Custom reseller prefix set, but without trailing underscore
         app = swift.Swift(
-            FakeApp(), {'reseller_prefix': 'CUSTOM'})
+            _FAKE_APP, {'reseller_prefix': 'CUSTOM'})
         req = FakeRequest('/1.0/CUSTOM_account/container/obj',
-                          environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual("account", data[2]['target']['id'])
+                          environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        self.assertEqual("account", data[2]['target']['id'])
 
     def test_invalid_reseller_prefix(self):
         app = swift.Swift(
-            FakeApp(), {'reseller_prefix': 'AUTH_'})
+            _FAKE_APP, {'reseller_prefix': 'AUTH_'})
         req = FakeRequest('/1.0/admin/bucket',
-                          environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual("1.0/admin/bucket", data[2]['target']['id'])
+                          environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        self.assertEqual(1, len(self.notify.call_args_list))
+        data = self.notify.call_args_list[0][0]
+        self.assertEqual("1.0/admin/bucket", data[2]['target']['id'])
+
+    def _assert_ignored_projects(self, app, cases):
+        for proj_attr in _PROJECT_HEADERS:
+            for proj, calls in cases:
+                with self.subTest(attr=proj_attr, proj=proj):
+                    req = FakeRequest('/1.0/CUSTOM_account/container/obj',
+                                      environ={'REQUEST_METHOD': 'GET',
+                                               proj_attr: proj})
+                    self.notify.reset_mock()
+                    _consume(app(req.environ, self.start_response))
+                    self.assertEqual(calls, self.notify.call_count)
 
     def test_ignore_requests_from_project(self):
-        app = swift.Swift(FakeApp(), {'ignore_projects': 'skip_proj'})
-
-        for proj_attr in ['HTTP_X_SERVICE_PROJECT_ID', 'HTTP_X_PROJECT_ID',
-                          'HTTP_X_TENANT_ID']:
-            for proj, calls in [('good', 1), ('skip_proj', 0)]:
-                req = FakeRequest('/1.0/CUSTOM_account/container/obj',
-                                  environ={'REQUEST_METHOD': 'GET',
-                                           proj_attr: proj})
-            with mock.patch('oslo_messaging.Notifier.info') as notify:
-                list(app(req.environ, self.start_response))
-                self.assertEqual(calls, len(notify.call_args_list))
+        app = swift.Swift(_FAKE_APP, {'ignore_projects': 'skip_proj'})
+        self._assert_ignored_projects(app, [('good', 1), ('skip_proj', 0)])
 
     def test_ignore_requests_from_multiple_projects(self):
-        app = swift.Swift(FakeApp(), {'ignore_projects': 'skip_proj, ignore'})
-
-        for proj_attr in ['HTTP_X_SERVICE_PROJECT_ID', 'HTTP_X_PROJECT_ID',
-                          'HTTP_X_TENANT_ID']:
-            for proj, calls in [('good', 1), ('skip_proj', 0),
-                                ('also_good', 1), ('ignore', 0)]:
-                req = FakeRequest('/1.0/CUSTOM_account/container/obj',
-                                  environ={'REQUEST_METHOD': 'GET',
-                                           proj_attr: proj})
-            with mock.patch('oslo_messaging.Notifier.info') as notify:
-                list(app(req.environ, self.start_response))
-                self.assertEqual(calls, len(notify.call_args_list))
+        app = swift.Swift(_FAKE_APP, {'ignore_projects': 'skip_proj, ignore'})
+        self._assert_ignored_projects(app, [('good', 1), ('skip_proj', 0),
+                                            ('also_good', 1), ('ignore', 0)])
 
     def test_empty_reseller_prefix(self):
         app = swift.Swift(
-            FakeApp(), {'reseller_prefix': 'CUSTOM'})
+            _FAKE_APP, {'reseller_prefix': 'CUSTOM'})
         req = FakeRequest('/1.0/CUSTOM/container/obj',
-                          environ={'REQUEST_METHOD': 'GET'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            data = notify.call_args_list[0][0]
-            self.assertIsNot(0, len(data[2]['target']['id']))
-
-    def test_head_account(self):
-        app = swift.Swift(FakeApp(body=['']), {})
-        req = FakeRequest('/1.0/account',
-                          environ={'REQUEST_METHOD': 'HEAD'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertEqual(1, len(notify.call_args_list))
-            data = notify.call_args_list[0][0]
-            self.assertEqual('objectstore.http.request', data[1])
-            self.assertIsNone(data[2].get('measurements'))
-            metadata = data[2]['target']['metadata']
-            self.assertEqual('1.0', metadata['version'])
-            self.assertIsNone(metadata['container'])
-            self.assertIsNone(metadata['object'])
-            self.assertEqual('head', data[2]['target']['action'])
+                          environ=_GET_ENV)
+        _consume(app(req.environ, self.start_response))
+        data = self.notify.call_args_list[0][0]
+        self.assertIsNot(0, len(data[2]['target']['id']))
 
     def test_put_with_swift_source(self):
-        app = swift.Swift(FakeApp(), {})
+        app = self.app
 
         req = FakeRequest(
             '/1.0/account/container/obj',
             environ={'REQUEST_METHOD': 'PUT',
                      'wsgi.input':
-                     StringIO('some stuff'),
+                     io.BytesIO(b'some stuff'),
                      'swift.source': 'RL'})
-        with mock.patch('oslo_messaging.Notifier.info') as notify:
-            list(app(req.environ, self.start_response))
-            self.assertFalse(notify.called)
+        wsgi_input = req.environ['wsgi.input']
+        _consume(app(req.environ, self.start_response))
+        self.assertFalse(self.notify.called)
+        self.assertIs(wsgi_input, req.environ['wsgi.input'])
+
+    def test_notifier_shared_between_instances(self):
+        app1 = swift.Swift(_FAKE_APP, {})
+        app2 = swift.Swift(_FAKE_APP, {'reseller_prefix': 'CUSTOM_'})
+        app3 = swift.Swift(_FAKE_APP, {'topic': 'other'})
+        self.assertIs(app1._notifier, app2._notifier)
+        self.assertIsNot(app1._notifier, app3._notifier)
 
     def test_ignore_projects_without_keystone(self):
-        app = swift.Swift(FakeApp(), {
+        app = swift.Swift(_FAKE_APP, {
             'ignore_projects': 'cf0356aaac7c42bba5a744339a6169fa,'
                                '18157dd635bb413c9e27686fee93c583',
         })
         self.assertEqual(["cf0356aaac7c42bba5a744339a6169fa",
                           "18157dd635bb413c9e27686fee93c583"],
                          app.ignore_projects)
+        self.assertEqual(frozenset(app.ignore_projects), app._ignore_projects)
+
+    @mock.patch.object(swift.LOG, 'warning')
+    @mock.patch.object(swift, 'KeystoneClientLoader')
+    @mock.patch.object(swift.ksa_session, 'Session', mock.MagicMock())
+    @mock.patch.object(swift.ksa_base, 'get_plugin_loader', mock.MagicMock())
+    def test_ignore_projects_with_mocked_keystone(self, loader, warning):
+        # keystoneclient resources are unhashable
+        by_id = projects.Project(
+            None, {'id': 'cf0356aaac7c42bba5a744339a6169fa', 'name': 'admin'})
+        by_name = projects.Project(
+            None, {'id': '147cc0a9263c4964926f3ee7b6ba3685',
+                   'name': 'service'})
+
+        def get(name_or_id):
+            if name_or_id == by_id.id:
+                return by_id
+            raise ksa_exc.NotFound()
+
+        client = loader.return_value.load_from_options_getter.return_value
+        client.projects.get.side_effect = get
+        client.projects.list.side_effect = lambda name: (
+            [by_name] if name == 'service' else [])
+        app = swift.Swift(_FAKE_APP, {
+            'auth_type': 'password',
+            'ignore_projects': '%s,service,gnocchi' % by_id.id,
+        })
+        self.assertEqual([by_id.id, by_name.id], app.ignore_projects)
+        self.assertEqual(frozenset([by_id.id, by_name.id]),
+                         app._ignore_projects)
+        warning.assert_called_once_with(
+            "fail to find project '%s' in keystone", "gnocchi")
 
     @unittest.skip("fixme: needs to add missing mock coverage")
     @mock.patch.object(swift.LOG, 'warning')
@@ -452,7 +722,7 @@ class TestSwift(tests_base.TestCase):
             cassette_name='list_projects',
             cassette_library_dir='ceilometermiddleware/tests/data',
         ))
-        app = swift.Swift(FakeApp(), {
+        app = swift.Swift(_FAKE_APP, {
             'auth_type': 'v2password',
             'auth_url': 'https://[::1]:5000/v2.0',
             'username': 'admin',
@@ -470,8 +740,76 @@ class TestSwiftS3Api(TestSwift):
 
     def get_request(self, path, environ=None, headers=None):
         # Add Swift Path in environ, provided by swift s3api middleware
-        environ['swift.backend_path'] = path
+        environ = dict(environ, **{'swift.backend_path': path})
         # Emulate S3 api PATH_INFO by removing /v1 and account parts
         path = '/' + path.split('/', 3)[-1]
 
         return FakeRequest(path, environ=environ, headers=headers)
+
+
+class TestHelpers(tests_base.TestCase):
+
+    def test_event_buffer(self):
+        event_buffer = swift.EventBuffer(flush_size=2)
+        self.assertEqual([], event_buffer.swap(0))
+        event_buffer.put_nowait('event1')
+        self.assertEqual(['event1'], event_buffer.swap(0))
+        event_buffer.put_nowait('event2')
+        event_buffer.put_nowait('event3')
+        self.assertEqual(['event2', 'event3'], event_buffer.swap())
+        self.assertEqual(0, len(event_buffer))
+
+    def test_event_buffer_limit(self):
+        event_buffer = swift.EventBuffer()
+        for event in ('event1', 'event2', 'event3'):
+            event_buffer.put_nowait(event)
+        self.assertEqual(['event1', 'event2'], event_buffer.swap(0, 2))
+        # The rest is still ready for another sender, without waiting
+        self.assertEqual(['event3'], event_buffer.swap(None, 2))
+        self.assertEqual(0, len(event_buffer))
+
+    def test_event_buffer_drain_backlog(self):
+        # A broker outage with an unbounded queue leaves a large backlog
+        # that senders take one batch at a time.
+        event_buffer = swift.EventBuffer()
+        for i in range(300000):
+            event_buffer.put_nowait(i)
+        drained = []
+        while len(event_buffer):
+            drained.extend(event_buffer.swap(0, 1))
+        self.assertEqual(list(range(300000)), drained)
+
+    def test_senders_share_backlog(self):
+        # Each sender blocks in the notifier until all three publish at
+        # once, which only happens if they split the backlog between them.
+        barrier = threading.Barrier(3, timeout=_NOTIFY_TIMEOUT)
+        sent = queue.SimpleQueue()
+
+        def info(context, event_type, payload):
+            barrier.wait()
+            sent.put(len(payload['events']))
+
+        notifier = mock.Mock()
+        notifier.info.side_effect = info
+        event_buffer = swift.EventBuffer()
+        for i in range(6):
+            event_buffer.put_nowait(swift._EventRecord(
+                0, 'GET', 'success', None, None, 'account',
+                {'path': '1.0/account/container/obj%d' % i}, 0, 0))
+        swift.Swift._start_senders(3, notifier, event_buffer, 2)
+        self.assertEqual([2, 2, 2],
+                         [sent.get(timeout=_NOTIFY_TIMEOUT)
+                          for i in range(3)])
+
+    def test_parse_path(self):
+        for path, expected in [
+                ('1.0/account/container/dir/obj',
+                 ('1.0', 'account', 'container', 'dir/obj')),
+                ('1.0/account/container', ('1.0', 'account', 'container',
+                                           None)),
+                ('1.0/account/', ('1.0', 'account', None, None)),
+                ('1.0/account', ('1.0', 'account', None, None)),
+                ('5.0//', None),
+                ('v1/', None)]:
+            with self.subTest(path=path):
+                self.assertEqual(expected, swift._parse_path(path))